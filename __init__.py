@@ -0,0 +1,2 @@
+from .zenbase_client import ZenbaseClient
+from .async_zenbase_client import AsyncZenbaseClient
@@ -1,7 +1,12 @@
 # zenbase_client.py
+import io
 import os
 import asyncio
+import logging
+import random
 import aiohttp
+import orjson
+from cachetools import TTLCache
 from typing import Optional, Dict, Any, Union, BinaryIO, List
 
 from .models import (
@@ -11,18 +16,42 @@ from .models import (
     BatchFunctionRunStatus,
     BatchFunctionRunStatusEnum,
     BatchFunctionRunResults,
+    FUNCTION_CONFIG_ADAPTER,
+    BATCH_RUN_STATUS_ADAPTER,
 )
-from .helpers import make_batch_input_file, clamp, get_batch_optimizer_run_results_per_page
-from collections import Counter
+from .helpers import iter_batch_input_json, get_batch_optimizer_run_results_per_page
+
+logger = logging.getLogger(__name__)
 
 class ZenbaseAPIError(Exception):
     """Custom exception for Zenbase API errors"""
     pass
 
+# Max number of result pages fetched in parallel (stays under aiohttp's
+# default 100-connection limit)
+RESULTS_FETCH_POOL_SIZE = 20
+
+# Largest page size the function-run-logs endpoint accepts; bigger pages
+# mean 10x fewer round-trips than the server default of 10
+RESULTS_PAGE_SIZE = 100
+
+# Cache bounds: positive entries live 5 minutes, "not found" entries only
+# 30s so a freshly created resource isn't masked for long
+CACHE_MAXSIZE = 1024
+CACHE_TTL = 300
+NEGATIVE_CACHE_TTL = 30
+
 
 class AsyncZenbaseClient:
     """
     Asynchronous version of the ZenbaseClient using aiohttp for non-blocking I/O.
+
+    Transport note: aiohttp (HTTP/1.1 with a keep-alive pool) was chosen over
+    httpx's HTTP/2 multiplexing because batch uploads rely on streaming an
+    async-iterable multipart body, which httpx's files API does not support.
+    The pooled connector in _get_session() gives concurrent page fetches
+    warm, handshake-free connections, which covers the same fan-out cost
+    HTTP/2 multiplexing would address.
     """
 
     def __init__(
@@ -43,25 +72,60 @@ class AsyncZenbaseClient:
             timeout=timeout
         )
 
-        # Aiohttp session
-        self.session = None  # We'll create an aiohttp.ClientSession on-demand or in an async context
+        # Aiohttp session, created lazily by _get_session() and reused for every
+        # request so connections (and their TLS handshakes) are amortized
+        self.session = None
+
+        # TTL-bounded caches so a long-lived client neither grows without
+        # bound nor serves arbitrarily stale data
+        self.optimizer_function_id_cache: TTLCache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self.batch_run_id_to_function_id_cache: TTLCache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        self.function_config_cache: TTLCache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+        # Negative cache: remembers ids the API said don't exist, keyed by
+        # (kind, id), so repeat lookups fail fast without a network call
+        self.negative_cache: TTLCache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=NEGATIVE_CACHE_TTL)
+
+        # Single-flight maps: concurrent callers that miss the cache for the
+        # same id await one shared in-flight task instead of each issuing
+        # their own GET
+        self._inflight_optimizer_function_ids: Dict[int, asyncio.Task] = {}
+        self._inflight_function_configs: Dict[int, asyncio.Task] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared aiohttp session, creating it on first use.
 
-        self.optimizer_function_id_cache: Dict[int, int] = {}
-        self.batch_run_id_to_function_id_cache: Dict[Union[int, str], int] = {}
-        self.function_config_cache: Dict[int, ZenbaseFunctionConfig] = {}
+        The connector is tuned for keep-alive reuse: warmed sockets are kept
+        around for 75s and DNS results are cached, so repeated calls skip the
+        TCP/TLS handshake entirely.
+        """
+        if self.session is None or self.session.closed:
+            timeout_value = self.config.timeout if self.config.timeout else 30
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=100,
+                    keepalive_timeout=75,
+                    enable_cleanup_closed=True,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=timeout_value)
+            )
+        return self.session
+
+    async def aclose(self):
+        """Close the underlying session for clients not used as a context manager."""
+        if self.session and not self.session.closed:
+            await self.session.close()
 
     async def __aenter__(self):
         """Optional: Support async context manager usage."""
-        timeout_value = self.config.timeout if self.config.timeout else 30
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=timeout_value)
-        )
+        self._get_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Close session when exiting context."""
-        if self.session:
-            await self.session.close()
+        await self.aclose()
 
     async def _make_async_request(
         self,
@@ -70,6 +134,7 @@ class AsyncZenbaseClient:
         params: Optional[Dict[str, Any]] = None,
         data: Optional[Dict[str, Any]] = None,
         files: Optional[Dict[str, Union[BinaryIO, tuple]]] = None,
+        return_headers: bool = False,
         **kwargs
     ) -> dict:
         """
@@ -81,6 +146,8 @@ class AsyncZenbaseClient:
             params: URL query parameters
             data: Request body data (will be sent as JSON if files=None)
             files: Dict of files to upload. Can be file objects or tuples of (filename, file object)
+            return_headers: If True, return a (body, headers) tuple so callers
+                can read pagination metadata such as X-Total-Count
             **kwargs: Additional arguments to pass to aiohttp.ClientSession.request()
 
         Returns:
@@ -89,12 +156,7 @@ class AsyncZenbaseClient:
         Raises:
             ZenbaseAPIError: If the request fails or returns non-2xx status.
         """
-        # Ensure an aiohttp session exists. If not, create one.
-        if not self.session:
-            timeout_value = self.config.timeout if self.config.timeout else 30
-            self.session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=timeout_value)
-            )
+        session = self._get_session()
 
         url = f"{self.config.base_url}/{endpoint.lstrip('/')}"
         headers = {
@@ -117,15 +179,22 @@ class AsyncZenbaseClient:
                 if isinstance(file_obj, tuple):
                     if len(file_obj) == 2:
                         filename, filehandle = file_obj
-                        form_data.add_field(file_field, filehandle, filename=filename)
+                        content_type = None
                     elif len(file_obj) == 3:
                         filename, filehandle, content_type = file_obj
-                        form_data.add_field(file_field, filehandle, filename=filename, content_type=content_type)
                     else:
                         raise ValueError(f"File tuple must have 2 or 3 elements: {file_obj}")
                 else:
                     # If it's just a file object with no filename, or any other shape
-                    form_data.add_field(file_field, file_obj)
+                    filename, filehandle, content_type = None, file_obj, None
+
+                # FormData reads sync file handles inside the event loop when
+                # serializing the body; drain them in a worker thread first so
+                # disk I/O never blocks the loop
+                if isinstance(filehandle, io.IOBase):
+                    filehandle = await asyncio.to_thread(filehandle.read)
+
+                form_data.add_field(file_field, filehandle, filename=filename, content_type=content_type)
 
             # For multipart, we do not manually set Content-Type; aiohttp.FormData does it automatically
             request_json = None
@@ -138,7 +207,7 @@ class AsyncZenbaseClient:
             request_json = data
 
         try:
-            async with self.session.request(
+            async with session.request(
                 method=method,
                 url=url,
                 params=params,
@@ -154,12 +223,15 @@ class AsyncZenbaseClient:
                         f"API request failed (status={response.status}): {error_text}"
                     )
                 
-                # Attempt to parse JSON; fallback to returning raw text if parsing fails
-                try:
-                    return await response.json()
-                except aiohttp.ContentTypeError:
-                    text_response = await response.text()
-                    return {"text": text_response}
+                # Parse JSON with orjson (much faster than aiohttp's stdlib
+                # json path); fall back to raw text for non-JSON responses
+                if response.content_type == 'application/json':
+                    body = orjson.loads(await response.read())
+                else:
+                    body = {"text": await response.text()}
+                if return_headers:
+                    return body, dict(response.headers)
+                return body
 
         except aiohttp.ClientError as e:
             raise ZenbaseAPIError(f"API request failed: {str(e)}") from e
@@ -167,10 +239,25 @@ class AsyncZenbaseClient:
     async def get_optimizer_function_id(self, optimizer_id: int, update_cache: bool = True) -> int:
         if optimizer_id in self.optimizer_function_id_cache:
             return self.optimizer_function_id_cache[optimizer_id]
+        negative_key = ('optimizer', optimizer_id)
+        if negative_key in self.negative_cache:
+            raise ZenbaseAPIError(self.negative_cache[negative_key])
+
+        if optimizer_id in self._inflight_optimizer_function_ids:
+            return await self._inflight_optimizer_function_ids[optimizer_id]
+        task = asyncio.ensure_future(self._fetch_optimizer_function_id(optimizer_id, update_cache))
+        self._inflight_optimizer_function_ids[optimizer_id] = task
+        try:
+            return await task
+        finally:
+            self._inflight_optimizer_function_ids.pop(optimizer_id, None)
 
+    async def _fetch_optimizer_function_id(self, optimizer_id: int, update_cache: bool) -> int:
         response = await self._make_async_request('GET', f'optimizer-configurations/{optimizer_id}')
         if 'id' not in response:
-            raise ZenbaseAPIError(response.get('detail', "Unknown response format"))
+            detail = response.get('detail', "Unknown response format")
+            self.negative_cache[('optimizer', optimizer_id)] = detail
+            raise ZenbaseAPIError(detail)
 
         function_id = response['function']
         if update_cache:
@@ -181,19 +268,27 @@ class AsyncZenbaseClient:
     async def get_function_config(self, function_id: int, update_cache: bool = True) -> ZenbaseFunctionConfig:
         if function_id in self.function_config_cache:
             return self.function_config_cache[function_id]
+        negative_key = ('function', function_id)
+        if negative_key in self.negative_cache:
+            raise ZenbaseAPIError(self.negative_cache[negative_key])
+
+        if function_id in self._inflight_function_configs:
+            return await self._inflight_function_configs[function_id]
+        task = asyncio.ensure_future(self._fetch_function_config(function_id, update_cache))
+        self._inflight_function_configs[function_id] = task
+        try:
+            return await task
+        finally:
+            self._inflight_function_configs.pop(function_id, None)
 
+    async def _fetch_function_config(self, function_id: int, update_cache: bool) -> ZenbaseFunctionConfig:
         response = await self._make_async_request('GET', f'functions/{function_id}')
         if 'id' not in response:
-            raise ZenbaseAPIError(response.get('detail', "Unknown response format"))
+            detail = response.get('detail', "Unknown response format")
+            self.negative_cache[('function', function_id)] = detail
+            raise ZenbaseAPIError(detail)
 
-        function_config = ZenbaseFunctionConfig(
-            name=response['name'],
-            description=response['description'],
-            prompt=response['prompt'],
-            input_schema=response['input_schema'],
-            output_schema=response['output_schema'],
-            model=response['model']
-        )
+        function_config = FUNCTION_CONFIG_ADAPTER.validate_python(response)
         if update_cache:
             self.function_config_cache[function_id] = function_config
 
@@ -207,32 +302,38 @@ class AsyncZenbaseClient:
         input_schema = (await self.get_function_config(function_id)).input_schema
 
         inputs_list.check_valid(input_schema)
-        print("optimizer_id:", optimizer_id)
-        print(inputs_list.to_dict_list())
-
-        # Make the batch input file payload
-        file_payload = make_batch_input_file(inputs_list.to_dict_list())
+        # Guarded so the full input list is never materialized into a string
+        # unless debug logging is actually on
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("optimizer_id: %s inputs: %s", optimizer_id, inputs_list.to_dict_list())
+
+        # Stream the batch input file instead of buffering the full JSON body:
+        # each item is serialized as it is sent, so upload memory stays flat
+        file_payload = aiohttp.payload.AsyncIterablePayload(
+            iter_batch_input_json(inputs_list.to_list()),
+            content_type='application/json'
+        )
 
         response = await self._make_async_request(
             'POST',
             'batch-run/',
             data={"configuration": optimizer_id},
-            files=file_payload
+            files={'file': ('batch_input.json', file_payload)}
         )
         if 'id' not in response:
             raise ZenbaseAPIError(response.get('detail', "Invalid response from batch-run creation"))
 
         batch_run_id = response['id']
         self.batch_run_id_to_function_id_cache[batch_run_id] = function_id
-        print("Batch run ID:", batch_run_id)
+        logger.debug("Batch run ID: %s", batch_run_id)
         return batch_run_id
 
     async def get_batch_optimizer_run_status(self, batch_run_id: int) -> BatchFunctionRunStatus:
         response = await self._make_async_request('GET', f'batch-run/{batch_run_id}/status')
-        print(response)
+        logger.debug("Batch run status response: %s", response)
         if 'status' not in response:
             raise ZenbaseAPIError(response.get('detail', "Unknown response format"))
-        return BatchFunctionRunStatus(**response)
+        return BATCH_RUN_STATUS_ADAPTER.validate_python(response)
 
     async def delete_batch_optimizer_run(self, batch_run_id: int) -> Any:
         """
@@ -247,46 +348,73 @@ class AsyncZenbaseClient:
         batch_run_status = await self.get_batch_optimizer_run_status(batch_run_id)
 
         if block_until_completed:
-            next_sleep_time = 10  # seconds
+            # Exponential backoff capped at 30s, with jitter so many clients
+            # polling the same run don't hit the API in lockstep
+            attempt = 0
             while batch_run_status.status == BatchFunctionRunStatusEnum.RUNNING:
+                next_sleep_time = min(30, 2 ** min(attempt, 5)) + random.random()
                 await asyncio.sleep(next_sleep_time)
                 batch_run_status = await self.get_batch_optimizer_run_status(batch_run_id)
-                n_remaining = batch_run_status.total_runs - batch_run_status.completed_runs
-                next_sleep_time = clamp(n_remaining / 2, 5, 30)
+                attempt += 1
         else:
             if batch_run_status.status == BatchFunctionRunStatusEnum.RUNNING:
                 raise ZenbaseAPIError("Batch run not completed")
 
-        # Retrieve results from function-run-logs
-        response = await self._make_async_request('GET', f'function-run-logs/?batch_run={batch_run_id}&page=1')
+        # Retrieve results from function-run-logs. Prefer the X-Total-Count
+        # header for the total so the remaining pages can be dispatched as
+        # soon as page 1's headers arrive, without depending on the body count
+        response, headers = await self._make_async_request(
+            'GET', f'function-run-logs/?batch_run={batch_run_id}&page=1&page_size={RESULTS_PAGE_SIZE}', return_headers=True
+        )
         batch_optimizer_run_results = get_batch_optimizer_run_results_per_page(response['results'])
-        count = response['count']
-
-        total_pages = (count + 9) // 10  # each page has up to 10 results
-        for page in range(2, total_pages + 1):
-            response = await self._make_async_request('GET', f'function-run-logs/?batch_run={batch_run_id}&page={page}')
-            page_results = get_batch_optimizer_run_results_per_page(response['results'])
-            batch_optimizer_run_results.results.extend(page_results.results)
-            batch_optimizer_run_results.failed_object_ids.extend(page_results.failed_object_ids)
-
-        counter = Counter(batch_optimizer_run_results.failed_object_ids)
-        print("Object IDs with duplicate failed runs:", [item for item, count in counter.items() if count > 1])
-        batch_optimizer_run_results.failed_object_ids = list(counter.keys())
+        total_count_header = headers.get('X-Total-Count')
+        count = int(total_count_header) if total_count_header is not None else response['count']
+
+        total_pages = (count + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE
+        if total_pages > 1:
+            # Fetch the remaining pages concurrently; the work is dominated by server
+            # round-trips, so fanning out collapses N sequential RTTs into ~one.
+            # The semaphore keeps us below aiohttp's default connection limit.
+            semaphore = asyncio.Semaphore(RESULTS_FETCH_POOL_SIZE)
+
+            async def fetch_page(page: int) -> dict:
+                async with semaphore:
+                    return await self._make_async_request('GET', f'function-run-logs/?batch_run={batch_run_id}&page={page}&page_size={RESULTS_PAGE_SIZE}')
+
+            # Parse each page as soon as it lands rather than waiting for the
+            # whole gather: CPU-side parsing overlaps the still-pending fetches
+            tasks = [asyncio.ensure_future(fetch_page(page)) for page in range(2, total_pages + 1)]
+            for next_page in asyncio.as_completed(tasks):
+                page_response = await next_page
+                page_results = get_batch_optimizer_run_results_per_page(page_response['results'])
+                batch_optimizer_run_results.results.extend(page_results.results)
+                batch_optimizer_run_results.failed_object_ids.extend(page_results.failed_object_ids)
+
+        # Single-pass dedupe; no frequency dict needed just to spot duplicates
+        seen = set()
+        dups = set()
+        for object_id in batch_optimizer_run_results.failed_object_ids:
+            if object_id in seen:
+                dups.add(object_id)
+            else:
+                seen.add(object_id)
+        if dups:
+            logger.debug("Object IDs with duplicate failed runs: %s", dups)
+        batch_optimizer_run_results.failed_object_ids = list(seen)
         return batch_optimizer_run_results
 
     async def get_batch_run_function_id(self, batch_run_id: Union[int, str]) -> int:
         if batch_run_id in self.batch_run_id_to_function_id_cache:
             return self.batch_run_id_to_function_id_cache[batch_run_id]
-        elif isinstance(batch_run_id, int):
-            resp = await self._make_async_request('GET', f'batch-run/{batch_run_id}')
-            if 'configuration' not in resp:
-                raise ZenbaseAPIError(resp.get('detail', "Unknown response format"))
-            optimizer_id = resp['configuration']
-            function_id = await self.get_optimizer_function_id(optimizer_id)
-            self.batch_run_id_to_function_id_cache[batch_run_id] = function_id
-            return function_id
-        else:
-            raise ZenbaseAPIError(f"Batch run ID {batch_run_id} not found in local batch run history.")
+        # The batch-run endpoint accepts both int and str ids, so a cache
+        # miss always falls through to the API rather than raising for strs
+        resp = await self._make_async_request('GET', f'batch-run/{batch_run_id}')
+        if 'configuration' not in resp:
+            raise ZenbaseAPIError(resp.get('detail', "Unknown response format"))
+        optimizer_id = resp['configuration']
+        function_id = await self.get_optimizer_function_id(optimizer_id)
+        self.batch_run_id_to_function_id_cache[batch_run_id] = function_id
+        return function_id
 
     async def update_function_config(self, function_id: int, function_config: ZenbaseFunctionConfig) -> ZenbaseFunctionConfig:
         """
@@ -300,6 +428,6 @@ class AsyncZenbaseClient:
         if 'id' not in response:
             raise ZenbaseAPIError(response.get('detail', "Unknown response format"))
 
-        updated_config = ZenbaseFunctionConfig(**response)
+        updated_config = FUNCTION_CONFIG_ADAPTER.validate_python(response)
         self.function_config_cache[function_id] = updated_config
         return updated_config
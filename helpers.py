@@ -1,18 +1,76 @@
 # helpers.py
 import jsonschema
-from io import BytesIO
+import orjson
 from typing import Optional, Dict, Any, Union, BinaryIO, List
-import json
 from string import Formatter
-from copy import deepcopy
+from collections import deque
 from .models import ZenbaseFunctionInput, ZenbaseFunctionOutput, BatchFunctionRunResults, BatchFunctionInputList
     
-def make_batch_input_file(inputs_list: Any) -> BytesIO:
-    json_data = json.dumps(inputs_list).encode('utf-8')
-    file_obj = BytesIO(json_data)
-    files = {'file': ('batch_input.json', file_obj, 'application/json')}
+def make_batch_input_file(inputs_list: Any) -> Dict[str, tuple]:
+    # orjson serializes straight to bytes in C, several times faster than
+    # stdlib json for large input lists. The raw bytes go into the field
+    # directly: no BytesIO wrapper, so the upload layer knows the length
+    # up front and reads from the buffer without per-chunk Python calls
+    json_data = orjson.dumps(inputs_list)
+    files = {'file': ('batch_input.json', json_data, 'application/json')}
     return files
 
+def iter_batch_input_json_chunks(items: List[Any]):
+    """
+    Yield the JSON array body for a batch input file one item at a time
+    (synchronous counterpart of iter_batch_input_json).
+    """
+    yield b'['
+    for index, item in enumerate(items):
+        if index:
+            yield b','
+        item_dict = item.model_dump() if hasattr(item, 'model_dump') else item
+        yield orjson.dumps(item_dict)
+    yield b']'
+
+class ChunkedBatchInputFile:
+    """
+    File-like reader over iter_batch_input_json_chunks for requests uploads.
+
+    Items are serialized as the upload layer reads the body, so peak memory
+    is one copy of the encoded payload rather than the dict list, the
+    encoded string, and the request body all held at once.
+    """
+
+    def __init__(self, items: List[Any]):
+        self._chunks = iter_batch_input_json_chunks(items)
+        self._pending = b''
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._pending + b''.join(self._chunks)
+            self._pending = b''
+            return data
+        while len(self._pending) < size:
+            try:
+                self._pending += next(self._chunks)
+            except StopIteration:
+                break
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+async def iter_batch_input_json(items: List[Any]):
+    """
+    Yield the JSON array body for a batch input file one item at a time.
+
+    Serializing per item keeps peak memory at O(single item) instead of
+    materializing the whole payload up front, which matters for large
+    input lists. Items may be pydantic models (dumped via model_dump)
+    or plain dicts.
+    """
+    yield b'['
+    for index, item in enumerate(items):
+        if index:
+            yield b','
+        item_dict = item.model_dump() if hasattr(item, 'model_dump') else item
+        yield orjson.dumps(item_dict)
+    yield b']'
+
 def get_top_level_schema_fields(schema):
     """
     Extract top-level field names from a JSON Schema.
@@ -49,13 +107,17 @@ def get_format_fields(template):
 def get_batch_optimizer_run_results_per_page(batch_run_results: List[dict]) -> BatchFunctionRunResults:
     results = []
     failed_object_ids = []
+    # Bind the hot-loop callables to locals once; with from_api skipping
+    # validation, each row is a dict lookup plus one append
+    append_result = results.append
+    append_failed = failed_object_ids.append
+    make_output = ZenbaseFunctionOutput.from_api
     for result in batch_run_results:
-        object_id = result['object_id']
         outputs = result['outputs']
-        if outputs == None:
-            failed_object_ids.append(object_id)
+        if outputs is None:
+            append_failed(result['object_id'])
         else:
-            results.append(ZenbaseFunctionOutput(object_id=object_id, outputs=outputs['output']))
+            append_result(make_output(result['object_id'], outputs['output']))
     return BatchFunctionRunResults(results=results, failed_object_ids=failed_object_ids)
 
 def convert_to_openai_response_format(schema: dict) -> dict:
@@ -68,19 +130,20 @@ def convert_to_openai_response_format(schema: dict) -> dict:
     Returns:
         dict: The OpenAI-compatible response format.
     """
-    def add_additional_properties_false(schema_part: dict):
-        """
-        Recursively add additionalProperties=False to all objects in the schema.
-        """
-        if schema_part.get("type") == "object":
-            schema_part["additionalProperties"] = False
-            for key, value in schema_part.get("properties", {}).items():
-                add_additional_properties_false(value)
-        elif schema_part.get("type") == "array":
-            add_additional_properties_false(schema_part.get("items", {}))
-
-    schema = deepcopy(schema)
-    add_additional_properties_false(schema)
+    # Round-tripping through orjson clones the (pure-JSON) schema far faster
+    # than deepcopy, and the explicit deque avoids per-frame recursion
+    # overhead on deep schemas
+    schema = orjson.loads(orjson.dumps(schema))
+    nodes = deque([schema])
+    while nodes:
+        node = nodes.popleft()
+        if node.get("type") == "object":
+            node["additionalProperties"] = False
+            nodes.extend(node.get("properties", {}).values())
+        elif node.get("type") == "array":
+            items = node.get("items")
+            if items:
+                nodes.append(items)
 
     openai_response = {
         "type": "json_schema",
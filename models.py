@@ -1,15 +1,24 @@
 # models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import Optional, Dict, Any, Union, BinaryIO, List
-from .validation import matches_schema
+from .validation import get_validator
 from enum import Enum
 
+# Shared config for the lightweight payload models: no assignment
+# re-validation and extra server fields are dropped rather than stored,
+# keeping per-instance cost down for high-fanout batches
+_LEAN_MODEL_CONFIG = ConfigDict(extra='ignore', validate_assignment=False)
+
 class ZenbaseConfig(BaseModel):
+    model_config = _LEAN_MODEL_CONFIG
+
     api_key: str
     base_url: str = "https://orch.zenbase.ai/api"  # Example base URL
     timeout: Optional[int] = 30
 
 class ZenbaseFunctionConfig(BaseModel):
+    model_config = _LEAN_MODEL_CONFIG
+
     name: Optional[str] = None
     description: Optional[str] = None
     prompt: Optional[str] = None
@@ -18,28 +27,50 @@ class ZenbaseFunctionConfig(BaseModel):
     output_schema: Optional[dict] = None
 
 class ZenbaseFunctionInput(BaseModel):
+    model_config = _LEAN_MODEL_CONFIG
+
     inputs: dict
     object_id: Optional[int] = None
 
 class ZenbaseFunctionOutput(BaseModel):
+    model_config = _LEAN_MODEL_CONFIG
+
     outputs: dict | None
     object_id: Optional[int] = None
 
+    @classmethod
+    def from_api(cls, object_id: Optional[int], outputs: dict | None) -> "ZenbaseFunctionOutput":
+        # Server data is already validated upstream, so skip the pydantic
+        # validation pipeline entirely when building outputs en masse
+        return cls.model_construct(object_id=object_id, outputs=outputs)
+
 class BatchFunctionRunStatusEnum(Enum):
     FAILED = "FAILED"
     COMPLETED = "COMPLETED"
     RUNNING = "RUNNING"
 
 class BatchFunctionRunStatus(BaseModel):
+    model_config = _LEAN_MODEL_CONFIG
+
     status: BatchFunctionRunStatusEnum
     total_runs: int
     completed_runs: int
     failed_runs: int
 
+# Module-level adapter so the whole items list is serialized in one
+# pydantic-core call rather than one model_dump() per item
+_FUNCTION_INPUT_LIST_ADAPTER = TypeAdapter(List[ZenbaseFunctionInput])
+
 class BatchFunctionRunResults(BaseModel):
     results: List[ZenbaseFunctionOutput]
     failed_object_ids: List[int]
 
+# Precompiled adapters for API response payloads: validating through a
+# module-level TypeAdapter skips the per-call validator construction that
+# BaseModel(**response) pays on every hot-path request
+FUNCTION_CONFIG_ADAPTER = TypeAdapter(ZenbaseFunctionConfig)
+BATCH_RUN_STATUS_ADAPTER = TypeAdapter(BatchFunctionRunStatus)
+
 class BatchFunctionInputList(BaseModel):
     items: List[ZenbaseFunctionInput]
     
@@ -55,21 +86,34 @@ class BatchFunctionInputList(BaseModel):
         return BatchFunctionInputList(items=[lookup.get(object_id) for object_id in object_ids])
     
     # Will raise an error if the inputs are not valid
-    def check_valid(self, input_schema: dict) -> bool:
-        object_ids = []
+    def check_valid(self, input_schema: Optional[dict]) -> bool:
+        # Functions without an input schema accept anything; nothing to check
+        if input_schema is None:
+            return True
+
+        # Compile the schema validator once and reuse it for every item
+        return self.check_valid_with(get_validator(input_schema))
+
+    def check_valid_with(self, validator) -> bool:
+        """Like check_valid, but takes an already-compiled schema validator
+        so callers that cache validators skip compilation entirely."""
+        seen_object_ids = set()
         for input_data in self.items:
-            if input_data.object_id in object_ids:
-                raise ValueError(f"Object ID {input_data.object_id} already exists in the list")
-            else:
-                object_ids.append(input_data.object_id)
-
-            if not matches_schema(input_schema, input_data.inputs):
-                raise ValueError(f"Input data for object ID {input_data.object_id} does not match the schema")
-            
+            # Set membership keeps the duplicate check O(1) per item; ids left
+            # as None are allowed to repeat
+            object_id = input_data.object_id
+            if object_id is not None:
+                if object_id in seen_object_ids:
+                    raise ValueError(f"Object ID {object_id} already exists in the list")
+                seen_object_ids.add(object_id)
+
+            if not validator.is_valid(input_data.inputs):
+                raise ValueError(f"Input data for object ID {object_id} does not match the schema")
+
         return True
     
-    def to_dict_list(self) -> dict:
-        return [item.model_dump() for item in self.items]
+    def to_dict_list(self) -> List[dict]:
+        return _FUNCTION_INPUT_LIST_ADAPTER.dump_python(self.items)
     
     def to_list(self) -> List[ZenbaseFunctionInput]:
         return self.items
@@ -1,12 +1,24 @@
 import jsonschema
+import orjson
+from functools import lru_cache
+
+@lru_cache(maxsize=128)
+def _get_validator_for_key(schema_key: bytes) -> jsonschema.Draft202012Validator:
+    return jsonschema.Draft202012Validator(orjson.loads(schema_key))
+
+def get_validator(schema: dict) -> jsonschema.Draft202012Validator:
+    """
+    Return a compiled validator for the schema, cached across calls.
+
+    Compiling a validator once and reusing its is_valid() skips the
+    meta-schema traversal jsonschema.validate() repeats on every call.
+    The cache is keyed on the schema's canonical JSON serialization.
+    """
+    return _get_validator_for_key(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS))
 
 def matches_schema(schema: dict, data: dict) -> bool:
     """
     Validates campaign recommendations data against the schema.
-    Returns True if valid, raises ValidationError if invalid.
+    Returns True if valid, False if invalid.
     """
-    try:
-        jsonschema.validate(instance=data, schema=schema)
-        return True
-    except jsonschema.exceptions.ValidationError as e:
-        return False
\ No newline at end of file
+    return get_validator(schema).is_valid(data)
@@ -1,13 +1,49 @@
 # zenbase_client.py
 import os
+import orjson
 import requests
+from cachetools import LRUCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, Dict, Any, Union, BinaryIO, List
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import random
+import threading
 import time
 
-from .models import ZenbaseConfig, ZenbaseFunctionConfig, BatchFunctionInputList, BatchFunctionRunStatus, BatchFunctionRunStatusEnum, BatchFunctionRunResults
-from .helpers import make_batch_input_file, clamp, get_batch_optimizer_run_results_per_page
+from .models import ZenbaseConfig, ZenbaseFunctionConfig, BatchFunctionInputList, BatchFunctionRunStatus, BatchFunctionRunStatusEnum, BatchFunctionRunResults, FUNCTION_CONFIG_ADAPTER, BATCH_RUN_STATUS_ADAPTER
+from .helpers import ChunkedBatchInputFile, clamp, get_batch_optimizer_run_results_per_page
+from .validation import get_validator
+
+# Largest page size the function-run-logs endpoint accepts; bigger pages
+# mean 10x fewer round-trips than the server default of 10
+RESULTS_PAGE_SIZE = 100
+
+# Upper bound on cached ids/configs so long-lived clients evict least
+# recently used entries instead of growing without limit
+CACHE_MAXSIZE = 1024
+
+logger = logging.getLogger(__name__)
 
 class ZenbaseClient:
+    # Slots keep instances compact and make attribute access a C-level
+    # slot lookup; matters for services creating many short-lived clients
+    __slots__ = (
+        'api_key',
+        'config',
+        '_base',
+        'session',
+        'optimizer_function_id_cache',
+        'batch_run_id_to_function_id_cache',
+        'function_config_cache',
+        '_validator_cache',
+        '_optimizer_input_schema_cache',
+        '_inflight',
+        '_inflight_lock',
+        '_get_template',
+    )
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -26,11 +62,90 @@ class ZenbaseClient:
             timeout=timeout
         )
         
-        # Initialize session with default headers
+        # Base URL normalized once so request URLs are a single concatenation
+        self._base = self.config.base_url.rstrip('/') + '/'
+
+        # Initialize session with default headers; setting them once here
+        # avoids rebuilding and re-merging a header dict on every request
         self.session = requests.Session()
-        self.optimizer_function_id_cache: Dict[int, int] = {}
-        self.batch_run_id_to_function_id_cache: Dict[Union[int, str], int] = {}
-        self.function_config_cache: Dict[int, ZenbaseFunctionConfig] = {}
+        self.session.headers.update({
+            'Authorization': f'Api-Key {self.config.api_key}',
+            'Accept': 'application/json',
+            # JSON compresses 5-10x; urllib3 decompresses transparently
+            # (brotli support comes from the brotli package)
+            'Accept-Encoding': 'gzip, br',
+        })
+
+        # Larger connection pool so bursts of requests (e.g. paginated result
+        # fetches) reuse keep-alive connections instead of re-handshaking,
+        # plus automatic retries for idempotent methods on transient errors
+        retry = Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'DELETE'])
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.optimizer_function_id_cache: LRUCache = LRUCache(maxsize=CACHE_MAXSIZE)
+        self.batch_run_id_to_function_id_cache: LRUCache = LRUCache(maxsize=CACHE_MAXSIZE)
+        self.function_config_cache: LRUCache = LRUCache(maxsize=CACHE_MAXSIZE)
+        # Compiled input-schema validators keyed by function id, so repeat
+        # batch submissions skip schema compilation entirely
+        self._validator_cache: LRUCache = LRUCache(maxsize=CACHE_MAXSIZE)
+        # Fused (function_id, input_schema) pairs keyed by optimizer id, so a
+        # repeat submission for the same optimizer needs zero pre-flight GETs
+        self._optimizer_input_schema_cache: LRUCache = LRUCache(maxsize=CACHE_MAXSIZE)
+
+        # Single-flight state: concurrent threads that miss the cache for the
+        # same key wait on one shared Future instead of each issuing a GET
+        self._inflight: Dict[tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        # Prepared GET template for hot loops (status polls, pagination):
+        # session.send() on a copy skips the cookie/header merging that
+        # Session.request would redo for every identical-shape call
+        self._get_template = self.session.prepare_request(requests.Request('GET', self._base))
+
+    def close(self):
+        """Close the underlying session, releasing pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        """Optional: Support context manager usage."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Close session when exiting context."""
+        self.close()
+
+    def _single_flight(self, key: tuple, fetch):
+        """
+        Run fetch() once per key at a time; concurrent callers for the same
+        key block on the first caller's Future and share its result (or its
+        exception).
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+        try:
+            result = fetch()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
 
     def _make_request(
             self,
@@ -39,8 +154,9 @@ class ZenbaseClient:
             params: Optional[Dict[str, Any]] = None,
             data: Optional[Dict[str, Any]] = None,
             files: Optional[Dict[str, Union[BinaryIO, tuple]]] = None,
+            return_response: bool = False,
             **kwargs
-        ) -> requests.Response:
+        ) -> Any:
             """
             Make HTTP request to Zenbase API
 
@@ -50,22 +166,25 @@ class ZenbaseClient:
                 params: URL query parameters
                 data: Request body data (will be sent as JSON if files=None)
                 files: Dict of files to upload. Can be file objects or tuples of (filename, file object)
+                return_response: If True, return the raw requests.Response
+                    instead of the parsed body (for callers that need status
+                    codes or headers, e.g. ETag revalidation)
                 **kwargs: Additional arguments to pass to requests.request()
 
             Returns:
-                requests.Response object
+                Parsed JSON body (None for empty responses), or the raw
+                requests.Response when return_response is True
 
             Raises:
-                ZenbaseAPIError: If the request fails
+                ZenbaseAPIError: If the request fails; carries the API's
+                    structured 'detail' message when one is present
             """
-            url = f"{self.config.base_url}/{endpoint.lstrip('/')}"
+            url = self._base + (endpoint[1:] if endpoint.startswith('/') else endpoint)
             
             try:
-                headers = {}
-                headers['Authorization'] = f'Api-Key {self.config.api_key}'
-                # headers['Accept'] = 'application/json'
-                if not files:
-                    headers['Content-Type'] = 'application/json'
+                # Auth/Accept headers live on the session; requests sets the
+                # right Content-Type itself (application/json for json=, the
+                # multipart boundary for files=)
                 if files:
                     # For multipart/form-data, send data as form fields
                     form_data = data if data else {}
@@ -75,34 +194,79 @@ class ZenbaseClient:
                         params=params,
                         data=form_data,
                         files=files,
-                        headers=headers,
                         timeout=self.config.timeout,
                         **kwargs
                     )
                 else:
-                    # For regular requests, send data as JSON
+                    # For regular requests, send data as JSON pre-encoded with
+                    # orjson (faster than the stdlib encoder json= would use)
+                    headers = kwargs.pop('headers', None)
+                    body = None
+                    if data is not None:
+                        body = orjson.dumps(data)
+                        headers = {'Content-Type': 'application/json', **(headers or {})}
                     response = self.session.request(
                         method=method,
                         url=url,
                         params=params,
-                        json=data,
+                        data=body,
                         headers=headers,
                         timeout=self.config.timeout,
                         **kwargs
                     )
                 
                 response.raise_for_status()
-                return response
-                
+                if return_response:
+                    return response
+                # Parse once here so callers get the body directly and never
+                # re-decode; empty bodies (e.g. DELETE) come back as None
+                return self._json(response) if response.content else None
+
+            except requests.exceptions.HTTPError as e:
+                # Surface the API's structured error message when there is one
+                detail = None
+                if e.response is not None and e.response.content:
+                    try:
+                        detail = orjson.loads(e.response.content).get('detail')
+                    except orjson.JSONDecodeError:
+                        pass
+                raise ZenbaseAPIError(detail or f"API request failed: {str(e)}") from e
             except requests.exceptions.RequestException as e:
                 # Handle API errors appropriately
                 raise ZenbaseAPIError(f"API request failed: {str(e)}") from e
-            
+
+    def _send_get(self, endpoint: str) -> requests.Response:
+        """
+        Fast-path GET built from the prepared template; used by the polling
+        and pagination hot loops where every request has the same shape.
+        """
+        request = self._get_template.copy()
+        request.url = self._base + endpoint
+        try:
+            response = self.session.send(request, timeout=self.config.timeout)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            raise ZenbaseAPIError(f"API request failed: {str(e)}") from e
+
+    @staticmethod
+    def _json(response: requests.Response) -> Any:
+        # orjson decodes response bytes directly, skipping the stdlib json
+        # path (and its str round-trip) used by response.json()
+        return orjson.loads(response.content)
+
+
     def get_optimizer_function_id(self, optimizer_id: int, update_cache: bool = True) -> int:
         # Retrive from cache if available
         if optimizer_id in self.optimizer_function_id_cache:
             return self.optimizer_function_id_cache[optimizer_id]
-        response = self._make_request('GET', f'optimizer-configurations/{optimizer_id}').json()
+        return self._single_flight(
+            ('optimizer', optimizer_id),
+            lambda: self._fetch_optimizer_function_id(optimizer_id, update_cache)
+        )
+
+    def _fetch_optimizer_function_id(self, optimizer_id: int, update_cache: bool) -> int:
+        response = self._make_request('GET', f'optimizer-configurations/{optimizer_id}')
         if 'id' not in response:
             raise ZenbaseAPIError(response['detail'])
         if update_cache:
@@ -110,22 +274,32 @@ class ZenbaseClient:
         return response['function']
 
     def get_function_config(self, function_id: int, update_cache: bool = True) -> ZenbaseFunctionConfig:
-        # Retrive from cache if available
-        if function_id in self.function_config_cache:
-            return self.function_config_cache[function_id]
-        response = self._make_request('GET', f'functions/{function_id}').json()
-        if 'id' not in response:
-            raise ZenbaseAPIError(response['detail'])
-        function_config = ZenbaseFunctionConfig(
-            name=response['name'],
-            description=response['description'],
-            prompt=response['prompt'],
-            input_schema=response['input_schema'],
-            output_schema=response['output_schema'],
-            model=response['model']
+        # Retrive from cache if available. Entries are (etag, config) pairs:
+        # without an ETag the cached config is served directly; with one we
+        # revalidate via If-None-Match, so a 304 skips the body transfer and
+        # deserialization while staying correct if the config changed
+        cached = self.function_config_cache.get(function_id)
+        if cached is not None and cached[0] is None:
+            return cached[1]
+        return self._single_flight(
+            ('function', function_id),
+            lambda: self._fetch_function_config(function_id, update_cache)
         )
+
+    def _fetch_function_config(self, function_id: int, update_cache: bool) -> ZenbaseFunctionConfig:
+        cached = self.function_config_cache.get(function_id)
+        if cached is not None and cached[0] is not None:
+            response = self._make_request('GET', f'functions/{function_id}', headers={'If-None-Match': cached[0]}, return_response=True)
+            if response.status_code == 304:
+                return cached[1]
+        else:
+            response = self._make_request('GET', f'functions/{function_id}', return_response=True)
+        body = self._json(response)
+        if 'id' not in body:
+            raise ZenbaseAPIError(body['detail'])
+        function_config = FUNCTION_CONFIG_ADAPTER.validate_python(body)
         if update_cache:
-            self.function_config_cache[function_id] = function_config
+            self.function_config_cache[function_id] = (response.headers.get('ETag'), function_config)
         return function_config
 
 
@@ -143,25 +317,37 @@ class ZenbaseClient:
         Raises:
             ZenbaseAPIError: If the API request fails or returns invalid response
         """
-        function_id = self.get_optimizer_function_id(optimizer_id)
-        input_schema = self.get_function_config(function_id).input_schema
+        cached_preflight = self._optimizer_input_schema_cache.get(optimizer_id)
+        if cached_preflight is not None:
+            function_id, input_schema = cached_preflight
+        else:
+            function_id = self.get_optimizer_function_id(optimizer_id)
+            input_schema = self.get_function_config(function_id).input_schema
+            self._optimizer_input_schema_cache[optimizer_id] = (function_id, input_schema)
 
-        inputs_list.check_valid(input_schema)
-        print(optimizer_id)
-        print(inputs_list.to_dict_list())
-        response = self._make_request('POST', 'batch-run/', data={"configuration": optimizer_id}, files=make_batch_input_file(inputs_list.to_dict_list())).json()
+        if input_schema is not None:
+            validator = self._validator_cache.get(function_id)
+            if validator is None:
+                validator = get_validator(input_schema)
+                self._validator_cache[function_id] = validator
+            inputs_list.check_valid_with(validator)
+        logger.debug("optimizer_id: %s", optimizer_id)
+        # Serialize items lazily as the body is read instead of materializing
+        # the whole dict list and its encoded bytes up front
+        file_obj = ChunkedBatchInputFile(inputs_list.to_list())
+        response = self._make_request('POST', 'batch-run/', data={"configuration": optimizer_id}, files={'file': ('batch_input.json', file_obj, 'application/json')})
         if 'id' not in response:
             raise ZenbaseAPIError(response['detail'])
         self.batch_run_id_to_function_id_cache[response['id']] = function_id
-        print("Batch run ID:", response['id'])
+        logger.debug("Batch run ID: %s", response['id'])
         return response['id']
     
     def get_batch_optimizer_run_status(self, batch_run_id: int) -> BatchFunctionRunStatus:
-        response = self._make_request('GET', f'batch-run/{batch_run_id}/status').json()
-        print(response)
+        response = self._json(self._send_get(f'batch-run/{batch_run_id}/status'))
+        logger.debug("Batch run status response: %s", response)
         if 'status' not in response:
             raise ZenbaseAPIError(response['detail'])
-        return BatchFunctionRunStatus(**response)
+        return BATCH_RUN_STATUS_ADAPTER.validate_python(response)
     
     def delete_batch_optimizer_run(self, batch_run_id: int) -> Any:
         # TODO: Update this function when the delete function returns something.
@@ -175,36 +361,61 @@ class ZenbaseClient:
     def get_batch_optimizer_run_results(self, batch_run_id: int, block_until_completed: bool = True) -> BatchFunctionRunResults:
         batch_run_status = self.get_batch_optimizer_run_status(batch_run_id)
         if block_until_completed:
-            next_sleep_time = 10 # seconds
+            # Adaptive polling: double the interval while the run is stalled,
+            # and when it is progressing size the sleep from an EMA of the
+            # observed completion rate so we wake up close to the finish.
+            # Jitter spreads out clients polling the same run.
+            next_sleep_time = 2  # seconds
+            rate_ema = None  # completed runs per second
+            last_completed = batch_run_status.completed_runs
+            last_poll = time.monotonic()
             while batch_run_status.status == BatchFunctionRunStatusEnum.RUNNING:
-                time.sleep(next_sleep_time)
+                time.sleep(next_sleep_time + random.uniform(0, 0.25) * next_sleep_time)
                 batch_run_status = self.get_batch_optimizer_run_status(batch_run_id)
-                n_remaining = batch_run_status.total_runs - batch_run_status.completed_runs
-                next_sleep_time = clamp(n_remaining / 2, 5, 30)
+                now = time.monotonic()
+                progressed = batch_run_status.completed_runs - last_completed
+                if progressed <= 0:
+                    next_sleep_time = min(next_sleep_time * 2, 30)
+                else:
+                    rate = progressed / (now - last_poll)
+                    rate_ema = rate if rate_ema is None else 0.5 * rate_ema + 0.5 * rate
+                    n_remaining = batch_run_status.total_runs - batch_run_status.completed_runs
+                    next_sleep_time = clamp(n_remaining / rate_ema / 2, 1, 30)
+                last_completed = batch_run_status.completed_runs
+                last_poll = now
         else:
             if batch_run_status.status == BatchFunctionRunStatusEnum.RUNNING:
                 raise ZenbaseAPIError("Batch run not completed")
             
-        results = self._make_request('GET', f'function-run-logs/?batch_run={batch_run_id}&page=1').json()
+        results = self._json(self._send_get(f'function-run-logs/?batch_run={batch_run_id}&page=1&page_size={RESULTS_PAGE_SIZE}'))
         batch_optimizer_run_results = get_batch_optimizer_run_results_per_page(results['results'])
         count = results['count']
-        for page in range(2, (count + 9) // 10):
-            results = self._make_request('GET', f'function-run-logs/?batch_run={batch_run_id}&page={page}').json()
-            batch_optimizer_run_results_per_page = get_batch_optimizer_run_results_per_page(results['results'])
-            batch_optimizer_run_results.results.extend(batch_optimizer_run_results_per_page.results)
-            batch_optimizer_run_results.failed_object_ids.extend(batch_optimizer_run_results_per_page.failed_object_ids)
+        # range stop is n_pages + 1 so the final partial page is included
+        n_pages = (count + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE
+        if n_pages > 1:
+            # Fetch the remaining pages in parallel over the shared Session
+            # (thread-safe for GETs, and the mounted adapter's pool is sized
+            # for it); executor.map keeps the results in page order
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                pages = list(executor.map(
+                    lambda page: self._json(self._send_get(f'function-run-logs/?batch_run={batch_run_id}&page={page}&page_size={RESULTS_PAGE_SIZE}')),
+                    range(2, n_pages + 1)
+                ))
+            for page_response in pages:
+                batch_optimizer_run_results_per_page = get_batch_optimizer_run_results_per_page(page_response['results'])
+                batch_optimizer_run_results.results.extend(batch_optimizer_run_results_per_page.results)
+                batch_optimizer_run_results.failed_object_ids.extend(batch_optimizer_run_results_per_page.failed_object_ids)
         return batch_optimizer_run_results
     
     def get_batch_run_function_id(self, batch_run_id: Union[int, str]) -> int:
         if batch_run_id in self.batch_run_id_to_function_id_cache:
             return self.batch_run_id_to_function_id_cache[batch_run_id]
-        elif isinstance(batch_run_id, int):
-            optimizer_id = self._make_request('GET', f'batch-run/{batch_run_id}').json()['configuration']
-            function_id = self.get_optimizer_function_id(optimizer_id)
-            self.batch_run_id_to_function_id_cache[batch_run_id] = function_id
-            return function_id
-        else:
-            raise ZenbaseAPIError(f"Batch run ID {batch_run_id} not found in local batch run history.")
+        # The batch-run endpoint accepts both int and str ids, so a cache
+        # miss always falls through to the API rather than raising for strs
+        optimizer_id = self._make_request('GET', f'batch-run/{batch_run_id}')['configuration']
+        function_id = self.get_optimizer_function_id(optimizer_id)
+        self.batch_run_id_to_function_id_cache[batch_run_id] = function_id
+        return function_id
         
     def update_function_config(self, function_id: int, function_config: ZenbaseFunctionConfig) -> ZenbaseFunctionConfig:
         """
@@ -220,12 +431,20 @@ class ZenbaseClient:
         Raises:
             ZenbaseAPIError: If the update request fails or returns invalid response
         """
-        response = self._make_request('PATCH', f'functions/{function_id}', data=function_config.model_dump(exclude_none=True)).json()
-        if 'id' not in response:
-            raise ZenbaseAPIError(response['detail'])
-        
-        self.function_config_cache[function_id] = ZenbaseFunctionConfig(**response)
-        return self.function_config_cache[function_id]
+        response = self._make_request('PATCH', f'functions/{function_id}', data=function_config.model_dump(exclude_none=True), return_response=True)
+        body = self._json(response)
+        if 'id' not in body:
+            raise ZenbaseAPIError(body['detail'])
+
+        updated_config = FUNCTION_CONFIG_ADAPTER.validate_python(body)
+        self.function_config_cache[function_id] = (response.headers.get('ETag'), updated_config)
+        # The input schema may have changed; drop any compiled validator and
+        # fused preflight entries for this function
+        self._validator_cache.pop(function_id, None)
+        for optimizer_id, (cached_function_id, _) in list(self._optimizer_input_schema_cache.items()):
+            if cached_function_id == function_id:
+                self._optimizer_input_schema_cache.pop(optimizer_id, None)
+        return updated_config
 
 class ZenbaseAPIError(Exception):
     """Custom exception for Zenbase API errors"""